@@ -1,14 +1,23 @@
 from .base import CLIResult, ToolResult
 from .bash import CommandTool
 from .collection import ToolCollection
-from .computer import ComputerTool
 from .edit import EditTool
 
-__ALL__ = [
-    CommandTool,
-    CLIResult,
-    ComputerTool,
-    EditTool,
-    ToolCollection,
-    ToolResult,
+__all__ = [
+    "CLIResult",
+    "CommandTool",
+    "ComputerTool",
+    "EditTool",
+    "ToolCollection",
+    "ToolResult",
 ]
+
+
+def __getattr__(name):
+    # ComputerTool pulls in the GUI stack, so import it on first access
+    # rather than eagerly with the rest of the package
+    if name == "ComputerTool":
+        from .computer import ComputerTool
+
+        return ComputerTool
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
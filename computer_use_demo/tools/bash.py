@@ -8,6 +8,17 @@ from anthropic.types.beta import BetaToolBash20241022Param
 
 from .base import BaseAnthropicTool, CLIResult, ToolError, ToolResult
 
+# platform.system() is not free, so resolve the platform (and everything
+# derived from it) once at import time
+_IS_WINDOWS = platform.system() == "Windows"
+_SHELL = "cmd.exe" if _IS_WINDOWS else "/bin/bash"
+_SHELL_NAME = "cmd.exe" if _IS_WINDOWS else "bash"
+_LINE_ENDING = "\r\n" if _IS_WINDOWS else "\n"
+
+# readuntil buffers at most this much between sentinels; the asyncio default
+# of 64 KiB is too small for commands with large output
+_STREAM_LIMIT = 2**20
+
 
 class _CommandSession:
     """A session of a command shell (cmd.exe on Windows, bash on Unix)."""
@@ -15,27 +26,39 @@ class _CommandSession:
     _started: bool
     _process: asyncio.subprocess.Process
 
-    _output_delay: float = 0.2  # seconds
     _timeout: float = 120.0  # seconds
     _sentinel: str = "<<exit>>"
 
     def __init__(self):
         self._started = False
         self._timed_out = False
-        # Use appropriate shell based on platform
-        self.command = "cmd.exe" if platform.system() == "Windows" else "/bin/bash"
+        self.command = _SHELL
         # Different echo syntax for Windows
-        self._sentinel_command = f"echo {self._sentinel}" if platform.system() == "Windows" else f"echo '{self._sentinel}'"
+        self._sentinel_command = f"echo {self._sentinel}" if _IS_WINDOWS else f"echo '{self._sentinel}'"
+        # pre-encode the sentinel (including the trailing line ending echo
+        # produces) so run() doesn't re-encode it per command and the stream
+        # is left positioned at the start of the next command's output
+        self._sentinel_bytes = f"{self._sentinel}{_LINE_ENDING}".encode()
+        # static framing appended to every command, encoded once
+        self._frame_suffix = f"{_LINE_ENDING}{self._sentinel_command}{_LINE_ENDING}".encode()
+        # stderr has no sentinel, so it is drained continuously by a
+        # background task into this buffer and snapshotted per command
+        self._stderr_buf = bytearray()
+        self._stderr_task: asyncio.Task | None = None
+        # commands share the shell's stdin/stdout, so runs must not interleave
+        self._run_lock = asyncio.Lock()
 
     async def start(self):
         if self._started:
             return
 
-        # Windows-specific process creation
-        if platform.system() == "Windows":
-            self._process = await asyncio.create_subprocess_shell(
+        # exec the shell directly instead of going through an extra
+        # "/bin/sh -c" (or cmd.exe /c) wrapper process
+        if _IS_WINDOWS:
+            self._process = await asyncio.create_subprocess_exec(
                 self.command,
                 bufsize=0,
+                limit=_STREAM_LIMIT,
                 stdin=asyncio.subprocess.PIPE,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
@@ -43,25 +66,36 @@ class _CommandSession:
                 creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
             )
         else:
-            self._process = await asyncio.create_subprocess_shell(
+            self._process = await asyncio.create_subprocess_exec(
                 self.command,
                 preexec_fn=os.setsid,
-                shell=True,
                 bufsize=0,
+                limit=_STREAM_LIMIT,
                 stdin=asyncio.subprocess.PIPE,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
             )
 
+        assert self._process.stderr
+        self._stderr_task = asyncio.create_task(self._drain_stderr())
         self._started = True
 
+    async def _drain_stderr(self):
+        """Continuously move stderr chunks into the session's buffer."""
+        assert self._process.stderr
+        while True:
+            chunk = await self._process.stderr.read(4096)
+            if not chunk:
+                break
+            self._stderr_buf.extend(chunk)
+
     def stop(self):
         """Terminate the command shell."""
         if not self._started:
             raise ToolError("Session has not started.")
         if self._process.returncode is not None:
             return
-        if platform.system() == "Windows":
+        if _IS_WINDOWS:
             import signal
             os.kill(self._process.pid, signal.CTRL_BREAK_EVENT)
         else:
@@ -71,61 +105,61 @@ class _CommandSession:
         """Execute a command in the shell."""
         if not self._started:
             raise ToolError("Session has not started.")
-        if self._process.returncode is not None:
-            shell_name = "cmd.exe" if platform.system() == "Windows" else "bash"
-            return ToolResult(
-                system="tool must be restarted",
-                error=f"{shell_name} has exited with returncode {self._process.returncode}",
-            )
-        if self._timed_out:
-            raise ToolError(
-                f"timed out: command has not returned in {self._timeout} seconds and must be restarted",
-            )
-
-        # we know these are not None because we created the process with PIPEs
-        assert self._process.stdin
-        assert self._process.stdout
-        assert self._process.stderr
-
-        # Add appropriate line endings for Windows
-        line_ending = "\r\n" if platform.system() == "Windows" else "\n"
-        
-        # send command to the process
-        full_command = f"{command}{line_ending}{self._sentinel_command}{line_ending}"
-        self._process.stdin.write(full_command.encode())
-        await self._process.stdin.drain()
-
-        # read output from the process, until the sentinel is found
-        try:
-            async with asyncio.timeout(self._timeout):
-                while True:
-                    await asyncio.sleep(self._output_delay)
-                    # if we read directly from stdout/stderr, it will wait forever for
-                    # EOF. use the StreamReader buffer directly instead.
-                    output = self._process.stdout._buffer.decode()  # pyright: ignore[reportAttributeAccessIssue]
-                    if self._sentinel in output:
-                        # strip the sentinel and break
-                        output = output[: output.index(self._sentinel)]
-                        break
-        except asyncio.TimeoutError:
-            self._timed_out = True
-            raise ToolError(
-                f"timed out: command has not returned in {self._timeout} seconds and must be restarted",
-            ) from None
-
-        # Normalize line endings
-        output = output.replace('\r\n', '\n')
-        if output.endswith("\n"):
-            output = output[:-1]
-
-        error = self._process.stderr._buffer.decode()  # pyright: ignore[reportAttributeAccessIssue]
-        error = error.replace('\r\n', '\n')
-        if error.endswith("\n"):
-            error = error[:-1]
-
-        # clear the buffers so that the next output can be read correctly
-        self._process.stdout._buffer.clear()  # pyright: ignore[reportAttributeAccessIssue]
-        self._process.stderr._buffer.clear()  # pyright: ignore[reportAttributeAccessIssue]
+        async with self._run_lock:
+            if self._process.returncode is not None:
+                return ToolResult(
+                    system="tool must be restarted",
+                    error=f"{_SHELL_NAME} has exited with returncode {self._process.returncode}",
+                )
+            if self._timed_out:
+                raise ToolError(
+                    f"timed out: command has not returned in {self._timeout} seconds and must be restarted",
+                )
+
+            # we know these are not None because we created the process with PIPEs
+            assert self._process.stdin
+            assert self._process.stdout
+            assert self._process.stderr
+
+            # send command to the process; the framing bytes are pre-encoded
+            self._process.stdin.write(command.encode())
+            self._process.stdin.write(self._frame_suffix)
+            await self._process.stdin.drain()
+
+            # read output from the process, until the sentinel is found. readuntil
+            # suspends until the data actually arrives, so there is no polling and
+            # no fixed delay added to each command.
+            try:
+                data = await asyncio.wait_for(
+                    self._process.stdout.readuntil(self._sentinel_bytes), self._timeout
+                )
+                output = data[: -len(self._sentinel_bytes)].decode()
+            except asyncio.LimitOverrunError:
+                raise ToolError(
+                    f"command produced more than {_STREAM_LIMIT} bytes of output and must be restarted",
+                ) from None
+            except asyncio.IncompleteReadError:
+                raise ToolError(
+                    f"{_SHELL_NAME} exited before the command completed and must be restarted",
+                ) from None
+            except asyncio.TimeoutError:
+                self._timed_out = True
+                raise ToolError(
+                    f"timed out: command has not returned in {self._timeout} seconds and must be restarted",
+                ) from None
+
+            # Normalize line endings
+            output = output.replace('\r\n', '\n')
+            if output.endswith("\n"):
+                output = output[:-1]
+
+            # snapshot and reset the stderr buffer so that the next command's
+            # error output can be read correctly
+            error = bytes(self._stderr_buf).decode()
+            self._stderr_buf.clear()
+            error = error.replace('\r\n', '\n')
+            if error.endswith("\n"):
+                error = error[:-1]
 
         return CLIResult(output=output, error=error)
 
@@ -142,25 +176,27 @@ class CommandTool(BaseAnthropicTool):
 
     def __init__(self):
         self._session = None
+        # serializes session creation so concurrent calls can't each spawn a shell
+        self._start_lock = asyncio.Lock()
         super().__init__()
 
     async def __call__(
         self, command: str | None = None, restart: bool = False, **kwargs
     ):
-        if restart:
-            if self._session:
-                self._session.stop()
-            self._session = _CommandSession()
-            await self._session.start()
-
-            return ToolResult(system="tool has been restarted.")
-
-        if self._session is None:
-            self._session = _CommandSession()
-            await self._session.start()
-
+        async with self._start_lock:
+            if restart or self._session is None:
+                if self._session:
+                    self._session.stop()
+                self._session = _CommandSession()
+                await self._session.start()
+
+                if restart:
+                    return ToolResult(system="tool has been restarted.")
+            session = self._session
+
+        # run the command outside the lock so a long command doesn't block restarts
         if command is not None:
-            return await self._session.run(command)
+            return await session.run(command)
 
         raise ToolError("no command provided.")
 
@@ -1,14 +1,14 @@
 import asyncio
 import base64
+import io
+import itertools
 import os
+import queue
 import shlex
 import shutil
 from enum import StrEnum
 from pathlib import Path
 from typing import Literal, TypedDict
-from uuid import uuid4
-import pyautogui
-import PIL.ImageGrab
 from anthropic.types.beta import BetaToolComputerUse20241022Param
 import logging
 
@@ -17,8 +17,33 @@ from .run import run
 
 OUTPUT_DIR = os.path.join(os.getenv('TEMP') or os.getenv('TMP') or '/tmp', 'outputs')
 
+# pyautogui and PIL.ImageGrab open a display connection on import, which
+# costs hundreds of ms at startup; load them on first use so sessions that
+# never touch the computer tool don't pay for it
+pyautogui = None
+PIL = None
+
+def _ensure_gui_libs():
+    global pyautogui, PIL
+    if pyautogui is None:
+        import PIL.Image
+        import PIL.ImageGrab
+        import pyautogui
+        # failsafe is a module global, so set it once at load rather than
+        # per ComputerTool instance
+        pyautogui.FAILSAFE = True
+
+# Screenshots are consumed by the model, not archived, so favor cheap
+# encoding: PNG at zlib level 1 by default, or lossy JPEG when
+# SCREENSHOT_FORMAT=jpeg is set.
+SCREENSHOT_FORMAT = (os.getenv("SCREENSHOT_FORMAT") or "png").lower()
+
+# reusable encode buffers so frequent screenshots don't reallocate
+# multi-megabyte BytesIO objects; bounded to keep resident memory small
+_BUF_POOL: queue.SimpleQueue[io.BytesIO] = queue.SimpleQueue()
+_BUF_POOL_MAX = 4
+
 TYPING_DELAY_MS = 12
-TYPING_GROUP_SIZE = 50
 
 Action = Literal[
     "key",
@@ -54,9 +79,6 @@ class ComputerToolOptions(TypedDict):
     display_width_px: int
     display_number: int | None
 
-def chunks(s: str, chunk_size: int) -> list[str]:
-    return [s[i : i + chunk_size] for i in range(0, len(s), chunk_size)]
-
 class ComputerTool(BaseAnthropicTool):
     """
     A tool that allows the agent to interact with the screen, keyboard, and mouse of the current computer.
@@ -69,7 +91,8 @@ class ComputerTool(BaseAnthropicTool):
     height: int
     display_num: int | None
 
-    _screenshot_delay = 2.0
+    _screenshot_delay = 0.3
+    _screenshot_max_delay = 2.0
     _scaling_enabled = True
 
     @property
@@ -93,9 +116,35 @@ class ComputerTool(BaseAnthropicTool):
         self.height = int(os.getenv("HEIGHT") or 1080)
         assert self.width and self.height, "WIDTH, HEIGHT must be set"
         self.display_num = int(os.getenv("DISPLAY_NUM")) if os.getenv("DISPLAY_NUM") else None
-        
-        # Initialize pyautogui with failsafe
-        pyautogui.FAILSAFE = True
+
+        # width/height never change after init, so resolve the scaling target
+        # and factors once instead of rescanning MAX_SCALING_TARGETS on every
+        # coordinate conversion; None means no scaling applies
+        self._x_factor: float | None = None
+        self._y_factor: float | None = None
+        if self._scaling_enabled:
+            ratio = self.width / self.height
+            for dimension in MAX_SCALING_TARGETS.values():
+                if abs(dimension["width"] / dimension["height"] - ratio) < 0.02:
+                    if dimension["width"] < self.width:
+                        self._x_factor = dimension["width"] / self.width
+                        self._y_factor = dimension["height"] / self.height
+                    break
+
+        # target size for screenshots; never changes after init
+        self._scaled_display = self.scale_coordinates(
+            ScalingSource.COMPUTER, self.width, self.height
+        )
+
+        # names persisted screenshots; cheaper than a uuid4 per shot
+        self._shot_counter = itertools.count()
+
+        # resolve and create the debug output directory once rather than
+        # paying a stat/mkdir round-trip on every screenshot
+        self._persist_screenshots = bool(os.getenv("SCREENSHOT_PERSIST"))
+        self._output_dir = Path(OUTPUT_DIR)
+        if self._persist_screenshots:
+            self._output_dir.mkdir(parents=True, exist_ok=True)
 
     async def __call__(
         self,
@@ -105,6 +154,7 @@ class ComputerTool(BaseAnthropicTool):
         coordinate: tuple[int, int] | None = None,
         **kwargs,
     ):
+        _ensure_gui_libs()
         if action in ("mouse_move", "left_click_drag"):
             if coordinate is None:
                 raise ToolError(f"coordinate is required for {action}")
@@ -118,12 +168,16 @@ class ComputerTool(BaseAnthropicTool):
             x, y = self.scale_coordinates(ScalingSource.API, coordinate[0], coordinate[1])
 
             if action == "mouse_move":
-                pyautogui.moveTo(x, y)
+                # pyautogui calls block, so keep them off the event loop
+                await asyncio.to_thread(pyautogui.moveTo, x, y)
                 return ToolResult(output="Mouse moved", error=None, base64_image=None)
             elif action == "left_click_drag":
-                pyautogui.mouseDown()
-                pyautogui.moveTo(x, y)
-                pyautogui.mouseUp()
+                def drag():
+                    pyautogui.mouseDown()
+                    pyautogui.moveTo(x, y)
+                    pyautogui.mouseUp()
+
+                await asyncio.to_thread(drag)
                 return await self.screenshot()
 
         if action in ("key", "type"):
@@ -135,11 +189,15 @@ class ComputerTool(BaseAnthropicTool):
                 raise ToolError(output=f"{text} must be a string")
 
             if action == "key":
-                pyautogui.press(text.split())
+                await asyncio.to_thread(pyautogui.press, text.split())
                 return await self.screenshot()
             elif action == "type":
-                for chunk in chunks(text, TYPING_GROUP_SIZE):
-                    pyautogui.write(chunk, interval=TYPING_DELAY_MS/1000)
+                # write() paces itself via interval and already runs off the
+                # event loop, so chunking the text buys nothing — one call,
+                # no intermediate substring lists
+                await asyncio.to_thread(
+                    pyautogui.write, text, interval=TYPING_DELAY_MS/1000
+                )
                 return await self.screenshot()
 
         if action in (
@@ -158,7 +216,7 @@ class ComputerTool(BaseAnthropicTool):
             if action == "screenshot":
                 return await self.screenshot()
             elif action == "cursor_position":
-                x, y = pyautogui.position()
+                x, y = await asyncio.to_thread(pyautogui.position)
                 x, y = self.scale_coordinates(ScalingSource.COMPUTER, x, y)
                 return ToolResult(output=f"X={x},Y={y}", error=None, base64_image=None)
             else:
@@ -168,48 +226,86 @@ class ComputerTool(BaseAnthropicTool):
                     "middle_click": pyautogui.middleClick,
                     "double_click": lambda: pyautogui.click(clicks=2, interval=0.5),
                 }[action]
-                click_func()
+                await asyncio.to_thread(click_func)
                 return await self.screenshot()
 
         raise ToolError(f"Invalid action: {action}")
 
     async def screenshot(self):
         """Take a screenshot of the current screen and return the base64 encoded image."""
-        output_dir = Path(OUTPUT_DIR)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        path = output_dir / f"screenshot_{uuid4().hex}.png"
-
+        _ensure_gui_libs()
         # Take screenshot using PIL
         screenshot = PIL.ImageGrab.grab()
-        
+
         if self._scaling_enabled:
-            x, y = self.scale_coordinates(ScalingSource.COMPUTER, self.width, self.height)
-            screenshot = screenshot.resize((x, y), PIL.Image.Resampling.LANCZOS)
-        
-        screenshot.save(str(path))
-
-        if path.exists():
-            return ToolResult(
-                output="Screenshot taken",
-                error=None,
-                base64_image=base64.b64encode(path.read_bytes()).decode()
-            )
-        raise ToolError("Failed to take screenshot")
-
-    async def shell(self, command: str, take_screenshot=True) -> ToolResult:
-        """Run a shell command and return the output, error, and optionally a screenshot."""
-        process = await asyncio.create_subprocess_shell(
-            command,
+            x, y = self._scaled_display
+            # BILINEAR is 5-10x cheaper than LANCZOS and indistinguishable
+            # for model consumption
+            screenshot = screenshot.resize((x, y), PIL.Image.Resampling.BILINEAR)
+
+        # encode in memory; the disk round-trip is only needed for debugging
+        try:
+            buf = _BUF_POOL.get_nowait()
+            buf.seek(0)
+            buf.truncate(0)
+        except queue.Empty:
+            buf = io.BytesIO()
+        if SCREENSHOT_FORMAT == "jpeg":
+            screenshot = screenshot.convert("RGB")  # JPEG has no alpha
+            screenshot.save(buf, format="JPEG", quality=80, optimize=False)
+        else:
+            screenshot.save(buf, format="PNG", optimize=False, compress_level=1)
+        data = buf.getvalue()
+        if _BUF_POOL.qsize() < _BUF_POOL_MAX:
+            _BUF_POOL.put(buf)
+
+        if self._persist_screenshots:
+            path = self._output_dir / f"screenshot_{os.getpid()}_{next(self._shot_counter)}.{SCREENSHOT_FORMAT}"
+            path.write_bytes(data)
+
+        return ToolResult(
+            output="Screenshot taken",
+            error=None,
+            base64_image=base64.b64encode(data).decode()
+        )
+
+    async def _wait_for_screen_settle(self):
+        """Wait until the screen stops changing, up to _screenshot_max_delay.
+
+        Compares coarse hashes of successive low-resolution grabs so fast UI
+        updates are captured in a few hundred ms instead of always paying the
+        worst-case delay.
+        """
+        _ensure_gui_libs()
+        last_hash = None
+        waited = 0.0
+        while waited < self._screenshot_max_delay:
+            grab = await asyncio.to_thread(PIL.ImageGrab.grab)
+            current_hash = hash(grab.resize((64, 36), PIL.Image.Resampling.NEAREST).tobytes())
+            if current_hash == last_hash:
+                return
+            last_hash = current_hash
+            await asyncio.sleep(0.1)
+            waited += 0.1
+
+    async def shell(self, command: str, take_screenshot=True, adaptive=True) -> ToolResult:
+        """Run a command and return the output, error, and optionally a screenshot."""
+        # exec the command directly rather than through "/bin/sh -c",
+        # saving a fork/exec and avoiding shell interpolation of arguments
+        process = await asyncio.create_subprocess_exec(
+            *shlex.split(command),
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
-            shell=True
         )
-        
+
         stdout, stderr = await process.communicate()
         base64_image = None
 
         if take_screenshot:
-            await asyncio.sleep(self._screenshot_delay)
+            if adaptive:
+                await self._wait_for_screen_settle()
+            else:
+                await asyncio.sleep(self._screenshot_delay)
             base64_image = (await self.screenshot()).base64_image
 
         return ToolResult(
@@ -220,21 +316,10 @@ class ComputerTool(BaseAnthropicTool):
 
     def scale_coordinates(self, source: ScalingSource, x: int, y: int):
         """Scale coordinates to a target maximum resolution."""
-        if not self._scaling_enabled:
-            return x, y
-        ratio = self.width / self.height
-        target_dimension = None
-        for dimension in MAX_SCALING_TARGETS.values():
-            if abs(dimension["width"] / dimension["height"] - ratio) < 0.02:
-                if dimension["width"] < self.width:
-                    target_dimension = dimension
-                break
-        if target_dimension is None:
+        if self._x_factor is None or self._y_factor is None:
             return x, y
-        x_scaling_factor = target_dimension["width"] / self.width
-        y_scaling_factor = target_dimension["height"] / self.height
         if source == ScalingSource.API:
             if x > self.width or y > self.height:
                 raise ToolError(f"Coordinates {x}, {y} are out of bounds")
-            return round(x / x_scaling_factor), round(y / y_scaling_factor)
-        return round(x * x_scaling_factor), round(y * y_scaling_factor)
\ No newline at end of file
+            return round(x / self._x_factor), round(y / self._y_factor)
+        return round(x * self._x_factor), round(y * self._y_factor)
\ No newline at end of file